@@ -0,0 +1,27 @@
+import os
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    """Deployment defaults, overridable with SITEPEEK_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix='SITEPEEK_')
+
+    # Per-type caps on the assets bundled by /download-all
+    max_css: int = Field(20, ge=0, le=200)
+    max_js: int = Field(20, ge=0, le=200)
+    max_images: int = Field(30, ge=0, le=200)
+    max_others: int = Field(10, ge=0, le=200)
+
+    # Asset downloads in flight per /download-all request, overall and per host
+    concurrency: int = Field(8, ge=1, le=200)
+    per_host: int = Field(4, ge=1, le=200)
+
+    # Timeout in seconds for fetching pages and files
+    timeout: int = Field(30, ge=1, le=600)
+
+    # Worker processes parsing HTML, by default one per CPU up to four
+    parse_workers: int = Field(default_factory=lambda: min(4, os.cpu_count() or 1), ge=1, le=64)
+
+settings = Settings()
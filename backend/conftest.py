@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Make the backend's top-level modules (main, config, utils) importable from tests,
+# whichever directory pytest is started from
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -1,14 +1,58 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, FileResponse
-from pydantic import BaseModel, HttpUrl
-import io
-import zipfile
-from typing import List, Dict, Any
-from utils.extractor import WebsiteExtractor
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from pydantic import BaseModel, HttpUrl, conint
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import aiohttp
+import logging
+import logging.handlers
+import multiprocessing
+import posixpath
+import queue
+import zipstream
+from cachetools import TTLCache
+from collections import defaultdict
+from urllib.parse import urlparse
+from typing import List, Dict, Any, AsyncIterator, Set, Tuple
+from utils.extractor import WebsiteExtractor, PageTooLargeError, extract_from_html
 from utils.downloader import FileDownloader
+from config import settings
 
-app = FastAPI(title="SitePeek API", version="1.0.0")
+# Log through a queue so handlers never block the event loop; the listener
+# thread writes records to stderr
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared HTTP clients on startup and release them on shutdown."""
+    _log_listener.start()
+    connector = aiohttp.TCPConnector(limit=200, limit_per_host=8, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        app.state.http = http
+        app.state.downloader = FileDownloader(timeout=settings.timeout, http=http)
+        # Worker processes for CPU-bound HTML parsing, keeping the event loop free.
+        # forkserver avoids forking this process while the log listener thread runs.
+        app.state.pool = ProcessPoolExecutor(
+            max_workers=settings.parse_workers,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+        yield
+        # Don't block the event loop waiting for workers to exit
+        app.state.pool.shutdown(wait=False, cancel_futures=True)
+        app.state.downloader.close()
+    _log_listener.stop()
+
+app = FastAPI(title="SitePeek API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware for frontend connection
 # In production, explicitly allow localhost for dev and vercel.app for frontend deployments
@@ -43,6 +87,151 @@ class AnalyzeResponse(BaseModel):
 
 class DownloadAllRequest(BaseModel):
     url: HttpUrl
+    # Per-type caps on bundled assets, and download parallelism overall and per host.
+    # Clients may lower the parallelism but never raise it past the configured settings.
+    max_css: conint(ge=0, le=200) = settings.max_css
+    max_js: conint(ge=0, le=200) = settings.max_js
+    max_images: conint(ge=0, le=200) = settings.max_images
+    max_others: conint(ge=0, le=200) = settings.max_others
+    concurrency: conint(ge=1, le=settings.concurrency) = settings.concurrency
+    per_host: conint(ge=1, le=settings.per_host) = settings.per_host
+
+# Recent /analyze responses keyed by URL, and the in-flight analyses that coalesce concurrent misses.
+# The cache is bounded by the total length of the cached HTML sources rather than
+# by entry count, and pages over an eighth of the budget are not cached at all.
+ANALYZE_CACHE_BYTES = 64 * 1024 * 1024
+_ANALYZE_CACHE: TTLCache = TTLCache(
+    maxsize=ANALYZE_CACHE_BYTES,
+    ttl=300,
+    getsizeof=lambda response: len(response.html_source) + 1
+)
+_ANALYZE_TASKS: Dict[str, asyncio.Task] = {}
+
+def _finish_analysis(url: str, task: asyncio.Task) -> None:
+    """Drop a finished analysis from the in-flight table, caching it if it succeeded."""
+    if _ANALYZE_TASKS.get(url) is task:
+        del _ANALYZE_TASKS[url]
+    if task.cancelled() or task.exception() is not None:
+        return
+    
+    response = task.result()
+    if _ANALYZE_CACHE.getsizeof(response) <= ANALYZE_CACHE_BYTES // 8:
+        _ANALYZE_CACHE[url] = response
+
+# Backoff delays (seconds) before retrying an asset the server throttled
+RETRY_BACKOFF = (0.5, 1, 2)
+RETRY_STATUSES = frozenset({429, 503})
+
+# Already-compressed formats stored as-is in /download-all archives rather than deflated again
+STORED_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.webp', '.woff', '.woff2',
+                         '.mp4', '.webm', '.mp3', '.ogg', '.zip'})
+
+async def _fetch_with_retry(
+    downloader: FileDownloader,
+    host_semaphore: asyncio.Semaphore,
+    url: str
+) -> bytes:
+    """Fetch an asset, backing off and retrying while the server answers 429/503."""
+    for delay in RETRY_BACKOFF:
+        try:
+            async with host_semaphore:
+                return await downloader.fetch_bytes(url)
+        except aiohttp.ClientResponseError as e:
+            if e.status not in RETRY_STATUSES:
+                raise
+        await asyncio.sleep(delay)
+    
+    # Final attempt after the longest backoff; errors propagate to the caller
+    async with host_semaphore:
+        return await downloader.fetch_bytes(url)
+
+async def _stream_zip(
+    html_source: str,
+    targets: List[Tuple[str, str, str]],
+    downloader: FileDownloader,
+    concurrency: int,
+    per_host: int
+) -> AsyncIterator[bytes]:
+    """
+    Generate a ZIP archive of the page and its assets, emitting each entry as soon
+    as its download finishes. At most `concurrency` downloads are pending or waiting
+    to be written at any time; the next one starts as each entry is emitted.
+    
+    Args:
+        html_source: HTML of the analyzed page, stored as index.html
+        targets: (file_url, folder, default_name) tuples for the assets to include
+        downloader: Downloader used to fetch each asset
+        concurrency: Maximum number of downloads in flight or buffered
+        per_host: Maximum number of downloads in flight per host
+        
+    Yields:
+        Chunks of the ZIP archive
+    """
+    # Entries are compressed in the threadpool as their chunks are pulled, keeping
+    # DEFLATE off the event loop
+    zip_stream = zipstream.ZipStream(compress_type=zipstream.ZIP_DEFLATED)
+    zip_stream.add(html_source, 'index.html')
+    async for chunk in iterate_in_threadpool(zip_stream.all_files()):
+        yield chunk
+    
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(per_host))
+    
+    async def fetch_target(target: Tuple[str, str, str]) -> Tuple[Tuple[str, str, str], Any]:
+        try:
+            file_url = target[0]
+            host_semaphore = host_semaphores[urlparse(file_url).netloc]
+            return target, await _fetch_with_retry(downloader, host_semaphore, file_url)
+        except Exception as e:
+            return target, e
+    
+    failed: List[Dict[str, str]] = []
+    remaining = iter(targets)
+    window: Set[asyncio.Task] = set()
+    
+    def fill_window() -> None:
+        while len(window) < concurrency:
+            target = next(remaining, None)
+            if target is None:
+                return
+            window.add(asyncio.create_task(fetch_target(target)))
+    
+    try:
+        fill_window()
+        while window:
+            done, _ = await asyncio.wait(window, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                (file_url, folder, default_name), result = task.result()
+                if isinstance(result, Exception):
+                    failed.append({"url": file_url, "err": str(result)})
+                else:
+                    filename = file_url.split('/')[-1].split('?')[0] or default_name
+                    stored = posixpath.splitext(filename)[1].lower() in STORED_EXTS
+                    zip_stream.add(
+                        result,
+                        f'{folder}/{filename}',
+                        compress_type=zipstream.ZIP_STORED if stored else None
+                    )
+                    async for chunk in iterate_in_threadpool(zip_stream.all_files()):
+                        yield chunk
+                
+                # Completed downloads hold a slot until written, bounding buffered bodies
+                window.discard(task)
+                fill_window()
+    finally:
+        # Stop outstanding downloads if the client disconnects mid-stream
+        for task in window:
+            task.cancel()
+        
+        # Report all failures for this archive in a single record
+        if failed:
+            logger.warning(
+                "Skipped %d of %d assets: %s",
+                len(failed), len(targets), "; ".join(f"{item['url']} ({item['err']})" for item in failed),
+                extra={"failed": failed}
+            )
+
+    for chunk in zip_stream.footer():
+        yield chunk
 
 @app.get("/")
 async def root():
@@ -58,6 +247,56 @@ async def healthz():
     """Lightweight health check path for Render/Load balancers"""
     return {"status": "ok", "version": "1.0.0"}
 
+async def _analyze(url: str) -> AnalyzeResponse:
+    """
+    Fetch a website and extract its assets, design elements, and structure.
+    
+    Args:
+        url: The URL to analyze
+        
+    Returns:
+        AnalyzeResponse with all extracted data
+    """
+    extractor = WebsiteExtractor(url, timeout=settings.timeout, http=app.state.http)
+    
+    # Fetch and parse the website
+    html_source = await extractor.fetch_html()
+    
+    # Extract all resources and design elements in a worker process
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(app.state.pool, extract_from_html, url, html_source)
+    css_files = data['css_files']
+    js_files = data['js_files']
+    images = data['images']
+    others = data['others']
+    colors = data['colors']
+    fonts = data['fonts']
+    
+    # Build file structure
+    structure = extractor.build_file_structure(
+        css_files + js_files + images + others
+    )
+    
+    # Calculate summary
+    summary = {
+        "total_css": len(css_files),
+        "total_js": len(js_files),
+        "total_images": len(images),
+        "total_others": len(others)
+    }
+    
+    return AnalyzeResponse(
+        html_source=html_source,
+        css_files=css_files,
+        js_files=js_files,
+        images=images,
+        others=others,
+        colors=colors,
+        fonts=fonts,
+        structure=structure,
+        summary=summary
+    )
+
 @app.post("/analyze", response_model=AnalyzeResponse)
 async def analyze_website(request: AnalyzeRequest):
     """
@@ -75,46 +314,25 @@ async def analyze_website(request: AnalyzeRequest):
     """
     try:
         url = str(request.url)
-        extractor = WebsiteExtractor(url)
-        
-        # Fetch and parse the website
-        html_source = extractor.fetch_html()
         
-        # Extract all resources
-        css_files = extractor.extract_css_files()
-        js_files = extractor.extract_js_files()
-        images = extractor.extract_images()
-        others = extractor.extract_other_files()
+        # Serve repeat requests for the same URL from the cache
+        cached = _ANALYZE_CACHE.get(url)
+        if cached is not None:
+            return cached
         
-        # Extract design elements
-        colors = extractor.extract_colors()
-        fonts = extractor.extract_fonts()
+        # Concurrent misses for a URL share one analysis, so only the first does the work
+        # and the others get its result or its error
+        task = _ANALYZE_TASKS.get(url)
+        if task is None:
+            task = asyncio.create_task(_analyze(url))
+            task.add_done_callback(lambda done: _finish_analysis(url, done))
+            _ANALYZE_TASKS[url] = task
         
-        # Build file structure
-        structure = extractor.build_file_structure(
-            css_files + js_files + images + others
-        )
-        
-        # Calculate summary
-        summary = {
-            "total_css": len(css_files),
-            "total_js": len(js_files),
-            "total_images": len(images),
-            "total_others": len(others)
-        }
-        
-        return AnalyzeResponse(
-            html_source=html_source,
-            css_files=css_files,
-            js_files=js_files,
-            images=images,
-            others=others,
-            colors=colors,
-            fonts=fonts,
-            structure=structure,
-            summary=summary
-        )
+        # Shield so one client disconnecting doesn't cancel the analysis for the rest
+        return await asyncio.shield(task)
         
+    except PageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except ConnectionError as e:
@@ -137,19 +355,23 @@ async def download_file(file_url: str):
         HTTPException: If the file cannot be downloaded
     """
     try:
-        downloader = FileDownloader()
-        file_content, content_type = downloader.download_file(file_url)
+        downloader = app.state.downloader
+        # requests blocks, so open the upstream response off the event loop
+        chunks, upstream_headers = await run_in_threadpool(downloader.stream_file, file_url)
+        content_type = upstream_headers.get('Content-Type', 'application/octet-stream')
         
         # Extract filename from URL
         filename = file_url.split('/')[-1].split('?')[0] or 'file'
+        headers = {
+            "Content-Disposition": f'attachment; filename="{filename}"'
+        }
         
-        return StreamingResponse(
-            io.BytesIO(file_content),
-            media_type=content_type,
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
+        # Pass the size through unless requests will decode a compressed body
+        content_length = upstream_headers.get('Content-Length')
+        if content_length and not upstream_headers.get('Content-Encoding'):
+            headers["Content-Length"] = content_length
+        
+        return StreamingResponse(chunks, media_type=content_type, headers=headers)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to download file: {str(e)}")
@@ -160,7 +382,7 @@ async def download_all_files(request: DownloadAllRequest):
     Download all files from the analyzed website as a ZIP archive.
     
     Args:
-        request: DownloadAllRequest containing the URL
+        request: DownloadAllRequest containing the URL, per-type caps and concurrency limits
         
     Returns:
         StreamingResponse with the ZIP file
@@ -170,71 +392,38 @@ async def download_all_files(request: DownloadAllRequest):
     """
     try:
         url = str(request.url)
-        extractor = WebsiteExtractor(url)
-        downloader = FileDownloader()
+        extractor = WebsiteExtractor(url, timeout=settings.timeout, http=app.state.http)
+        downloader = app.state.downloader
         
         # Fetch HTML source
-        html_source = extractor.fetch_html()
-        
-        # Extract all resource URLs
-        css_files = extractor.extract_css_files()
-        js_files = extractor.extract_js_files()
-        images = extractor.extract_images()
-        others = extractor.extract_other_files()
-        
-        # Create ZIP file in memory
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Add HTML source
-            zip_file.writestr('index.html', html_source)
-            
-            # Add CSS files
-            for css_url in css_files[:20]:  # Limit to prevent huge downloads
-                try:
-                    content, _ = downloader.download_file(css_url)
-                    filename = css_url.split('/')[-1].split('?')[0] or 'style.css'
-                    zip_file.writestr(f'css/{filename}', content)
-                except Exception as e:
-                    print(f"Failed to download {css_url}: {e}")
-            
-            # Add JS files
-            for js_url in js_files[:20]:
-                try:
-                    content, _ = downloader.download_file(js_url)
-                    filename = js_url.split('/')[-1].split('?')[0] or 'script.js'
-                    zip_file.writestr(f'js/{filename}', content)
-                except Exception as e:
-                    print(f"Failed to download {js_url}: {e}")
-            
-            # Add images
-            for img_url in images[:30]:
-                try:
-                    content, _ = downloader.download_file(img_url)
-                    filename = img_url.split('/')[-1].split('?')[0] or 'image.jpg'
-                    zip_file.writestr(f'images/{filename}', content)
-                except Exception as e:
-                    print(f"Failed to download {img_url}: {e}")
-            
-            # Add other files
-            for other_url in others[:10]:
-                try:
-                    content, _ = downloader.download_file(other_url)
-                    filename = other_url.split('/')[-1].split('?')[0] or 'file'
-                    zip_file.writestr(f'others/{filename}', content)
-                except Exception as e:
-                    print(f"Failed to download {other_url}: {e}")
-        
-        zip_buffer.seek(0)
+        html_source = await extractor.fetch_html()
+        
+        # Extract all resource URLs in a worker process
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(app.state.pool, extract_from_html, url, html_source)
+        css_files = data['css_files']
+        js_files = data['js_files']
+        images = data['images']
+        others = data['others']
+        
+        # Assets to bundle (capped per type to prevent huge downloads)
+        targets = (
+            [(file_url, 'css', 'style.css') for file_url in css_files[:request.max_css]]
+            + [(file_url, 'js', 'script.js') for file_url in js_files[:request.max_js]]
+            + [(file_url, 'images', 'image.jpg') for file_url in images[:request.max_images]]
+            + [(file_url, 'others', 'file') for file_url in others[:request.max_others]]
+        )
         
         return StreamingResponse(
-            zip_buffer,
+            _stream_zip(html_source, targets, downloader, request.concurrency, request.per_host),
             media_type="application/zip",
             headers={
                 "Content-Disposition": "attachment; filename=website_assets.zip"
             }
         )
         
+    except PageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create ZIP: {str(e)}")
 
@@ -0,0 +1,17 @@
+from utils.extractor import DIR_SELF_KEY, MAX_STYLED_ELEMENTS, WebsiteExtractor, extract_from_html
+
+
+def test_styled_asset_tags_are_counted_once():
+    # An <img> matches both the tag and [style] selectors
+    html = ''.join(f'<img style="color:#{i:06x}" src="/i{i}.png">' for i in range(3000))
+    result = extract_from_html('http://example.com/', html)
+    assert len(result['images']) == 3000
+    assert len(result['colors']) == MAX_STYLED_ELEMENTS
+
+
+def test_file_sharing_a_directory_name_is_kept_in_either_order():
+    urls = ['http://x/img/a.png', 'http://x/img/b.png', 'http://x/img']
+    expected = {'img': {'a.png': urls[0], 'b.png': urls[1], DIR_SELF_KEY: urls[2]}}
+    extractor = WebsiteExtractor('http://x/')
+    assert extractor.build_file_structure(urls) == expected
+    assert extractor.build_file_structure(urls[::-1]) == expected
@@ -1,47 +1,148 @@
+import aiohttp
 import requests
-from typing import Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from typing import Iterator, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+import posixpath
+
+# Content types keyed by lowercased file extension
+_EXTENSION_MAP = {
+    '.html': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.xml': 'application/xml',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+    '.webp': 'image/webp',
+    '.ico': 'image/x-icon',
+    '.pdf': 'application/pdf',
+    '.zip': 'application/zip',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.ttf': 'font/ttf',
+    '.eot': 'application/vnd.ms-fontobject',
+    '.otf': 'font/otf',
+    '.mp4': 'video/mp4',
+    '.webm': 'video/webm',
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.ogg': 'audio/ogg',
+}
+
+# Largest single asset fetch_bytes will buffer in memory
+MAX_FILE_BYTES = 25 * 1024 * 1024
+
+class FileTooLargeError(Exception):
+    """Raised when a file is larger than the configured download limit."""
 
 class FileDownloader:
     """Download files from URLs with proper content type handling."""
     
-    def __init__(self, timeout: int = 30):
+    def __init__(
+        self,
+        timeout: int = 30,
+        http: Optional[aiohttp.ClientSession] = None,
+        max_bytes: int = MAX_FILE_BYTES
+    ):
         """
         Initialize the downloader.
         
         Args:
             timeout: Request timeout in seconds
+            http: Shared aiohttp session used by fetch_bytes
+            max_bytes: Maximum size of a file fetched by fetch_bytes
         """
         self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.http = http
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
+        
+        # Persistent session so repeated requests reuse pooled keep-alive connections
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=2, backoff_factor=0.3)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
     
-    def download_file(self, url: str) -> Tuple[bytes, str]:
+    def close(self) -> None:
+        """Close the underlying session and its pooled connections."""
+        self.session.close()
+    
+    async def fetch_bytes(self, url: str) -> bytes:
         """
-        Download a file from a URL.
+        Download a file asynchronously over the shared aiohttp session.
         
         Args:
             url: The URL of the file to download
             
         Returns:
-            Tuple of (file_content as bytes, content_type as string)
+            File content as bytes
             
         Raises:
-            Exception: If the download fails
+            aiohttp.ClientError: If the request fails or returns an error status
+            FileTooLargeError: If the file is larger than max_bytes
         """
-        try:
-            response = requests.get(url, headers=self.headers, timeout=self.timeout)
+        async with self.http.get(
+            url,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        ) as response:
             response.raise_for_status()
             
-            # Get content type from response headers
-            content_type = response.headers.get('Content-Type', 'application/octet-stream')
+            if response.content_length is not None and response.content_length > self.max_bytes:
+                raise FileTooLargeError(f"File exceeds {self.max_bytes} bytes")
+            
+            # Read incrementally so an oversized body is abandoned early
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(65536):
+                body.extend(chunk)
+                if len(body) > self.max_bytes:
+                    raise FileTooLargeError(f"File exceeds {self.max_bytes} bytes")
+            return bytes(body)
+    
+    def stream_file(self, url: str, chunk_size: int = 65536) -> Tuple[Iterator[bytes], Mapping[str, str]]:
+        """
+        Open a streaming download of a file without buffering it in memory.
+        
+        Args:
+            url: The URL of the file to download
+            chunk_size: Number of bytes to read per chunk
             
-            return response.content, content_type
+        Returns:
+            Tuple of (iterator over content chunks, upstream response headers)
+            
+        Raises:
+            Exception: If the request fails or returns an error status
+        """
+        try:
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+            response.raise_for_status()
             
         except requests.exceptions.Timeout:
             raise Exception(f"Request timeout after {self.timeout} seconds")
         except requests.exceptions.RequestException as e:
+            if e.response is not None:
+                e.response.close()
             raise Exception(f"Failed to download file: {str(e)}")
+        
+        def iter_chunks() -> Iterator[bytes]:
+            try:
+                yield from response.iter_content(chunk_size)
+            finally:
+                response.close()
+        
+        return iter_chunks(), response.headers
     
     def get_content_type(self, url: str) -> str:
         """
@@ -53,12 +154,27 @@ class FileDownloader:
         Returns:
             Content type string
         """
+        # Known extensions need no network round-trip; only ask the server otherwise
+        content_type = self._guess_content_type(url)
+        if content_type != 'application/octet-stream':
+            return content_type
+        return self._head(url) or content_type
+    
+    def _head(self, url: str) -> Optional[str]:
+        """
+        Ask the server for a file's content type with a HEAD request.
+        
+        Args:
+            url: The URL of the file
+            
+        Returns:
+            Content type string, or None if the request fails or omits it
+        """
         try:
-            response = requests.head(url, headers=self.headers, timeout=self.timeout)
-            return response.headers.get('Content-Type', 'application/octet-stream')
-        except Exception:
-            # Fallback to guessing from extension
-            return self._guess_content_type(url)
+            response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+            return response.headers.get('Content-Type')
+        except requests.exceptions.RequestException:
+            return None
     
     def _guess_content_type(self, url: str) -> str:
         """
@@ -70,36 +186,5 @@ class FileDownloader:
         Returns:
             Guessed content type string
         """
-        extension_map = {
-            '.html': 'text/html',
-            '.css': 'text/css',
-            '.js': 'application/javascript',
-            '.json': 'application/json',
-            '.xml': 'application/xml',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.svg': 'image/svg+xml',
-            '.webp': 'image/webp',
-            '.ico': 'image/x-icon',
-            '.pdf': 'application/pdf',
-            '.zip': 'application/zip',
-            '.woff': 'font/woff',
-            '.woff2': 'font/woff2',
-            '.ttf': 'font/ttf',
-            '.eot': 'application/vnd.ms-fontobject',
-            '.otf': 'font/otf',
-            '.mp4': 'video/mp4',
-            '.webm': 'video/webm',
-            '.mp3': 'audio/mpeg',
-            '.wav': 'audio/wav',
-            '.ogg': 'audio/ogg',
-        }
-        
-        url_lower = url.lower()
-        for ext, content_type in extension_map.items():
-            if url_lower.endswith(ext):
-                return content_type
-        
-        return 'application/octet-stream'
\ No newline at end of file
+        extension = posixpath.splitext(urlparse(url).path)[1].lower()
+        return _EXTENSION_MAP.get(extension, 'application/octet-stream')
\ No newline at end of file
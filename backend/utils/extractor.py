@@ -1,87 +1,330 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+import asyncio
+import aiohttp
+import codecs
+from selectolax.lexbor import LexborHTMLParser
+from urllib.parse import urljoin, urlparse, urlsplit
+import posixpath
 import re
-from typing import List, Dict, Any, Set
+from typing import List, Dict, Any, Optional
+
+# Every element the extract_* methods inspect, matched in document order by one query
+_ASSET_SELECTOR = 'link, script, img, source, a, video, audio, style, [style]'
+
+# File extensions used to classify asset URLs
+_IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.bmp'})
+_FONT_EXTS = frozenset({'.woff', '.woff2', '.ttf', '.eot', '.otf'})
+_OTHER_EXTS = _FONT_EXTS | frozenset({'.pdf', '.doc', '.docx', '.xls', '.xlsx', '.zip',
+                                      '.mp4', '.webm', '.mp3', '.wav', '.ogg'})
+
+
+def _ext(url: str) -> str:
+    """Return the lowercased file extension of a URL path ('' if there is none)."""
+    return posixpath.splitext(urlsplit(url).path)[1].lower()
+
+
+# Precompiled patterns for color and font extraction; one combined pass per style string
+_COLOR_RE = re.compile(
+    r'#(?:[A-Fa-f0-9]{6}|[A-Fa-f0-9]{3})\b'
+    r'|rgb\s*\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*\)'
+    r'|rgba\s*\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*,\s*[\d.]+\s*\)'
+    r'|hsl\s*\(\s*\d+\s*,\s*\d+%\s*,\s*\d+%\s*\)',
+    re.IGNORECASE
+)
+_FONT_RE = re.compile(r'font-family\s*:\s*([^;}]+)', re.IGNORECASE)
+_FONTFACE_RE = re.compile(r'@font-face\s*\{[^}]*font-family\s*:\s*["\']?([^"\';}]+)', re.IGNORECASE | re.DOTALL)
+
+# Precompiled patterns for asset URLs found in attributes and CSS
+_SRCSET_URL_RE = re.compile(r'(https?://[^\s,]+)')
+_SRCSET_TOKEN_RE = re.compile(r'([^\s,]+)')
+_IMPORT_RE = re.compile(r'@import\s+["\']([^"\']+)["\']')
+_BG_URL_RE = re.compile(r'url\(["\']?([^"\')]+)["\']?\)')
+
+# Charset declared by <meta charset> or <meta http-equiv="Content-Type">, looked for
+# in the first kilobyte of the body as browsers do
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9._:-]+)', re.IGNORECASE)
+_META_PRESCAN_BYTES = 1024
+
+# Upper bounds on the work done for a single page. MAX_HTML_BYTES bounds the parse
+# and the selector query; the element caps only limit the per-node processing
+# (attribute reads, URL joins, style regexes), since the query returns every match.
+MAX_HTML_BYTES = 10 * 1024 * 1024
+MAX_ELEMENTS_PER_TAG = 5000
+MAX_STYLED_ELEMENTS = 2000
+
+# Key under which build_file_structure keeps a file that shares its path with a directory
+DIR_SELF_KEY = '.'
+
+# Keys of the dictionary returned by WebsiteExtractor.extract_all
+_RESULT_KEYS = ('css_files', 'js_files', 'images', 'others', 'colors', 'fonts')
+
+class PageTooLargeError(Exception):
+    """Raised when a page's HTML exceeds the configured size limit."""
+
+
+def _page_encoding(response: aiohttp.ClientResponse, body: bytes) -> str:
+    """
+    Pick the codec for a buffered page body.
+    
+    Follows ClientResponse.get_encoding (Content-Type charset first), which cannot
+    be called on a body read in chunks, then falls back to the charset declared in
+    <meta> and finally to UTF-8.
+    """
+    candidates = [response.charset]
+    match = _META_CHARSET_RE.search(body, 0, _META_PRESCAN_BYTES)
+    if match:
+        candidates.append(match.group(1).decode('ascii'))
+    
+    for candidate in candidates:
+        if candidate:
+            try:
+                return codecs.lookup(candidate).name
+            except LookupError:
+                continue
+    return 'utf-8'
+
 
 class WebsiteExtractor:
     """Extract and analyze website source code, assets, and design elements."""
     
-    def __init__(self, url: str, timeout: int = 30):
+    def __init__(
+        self,
+        url: str,
+        timeout: int = 30,
+        max_bytes: int = MAX_HTML_BYTES,
+        http: Optional[aiohttp.ClientSession] = None
+    ):
         """
         Initialize the extractor with a target URL.
         
         Args:
             url: The website URL to analyze
             timeout: Request timeout in seconds
+            max_bytes: Maximum size of the HTML document to download
+            http: Shared aiohttp session used by fetch_html
         """
         self.url = url
+        self.http = http
         self.timeout = timeout
-        self.soup = None
+        self.max_bytes = max_bytes
+        self.tree = None
         self.html_content = None
+        self._extracted = None
+        self._parsed_base = urlparse(url)
         self.base_url = self._get_base_url()
         
     def _get_base_url(self) -> str:
         """Extract the base URL from the full URL."""
-        parsed = urlparse(self.url)
+        parsed = self._parsed_base
         return f"{parsed.scheme}://{parsed.netloc}"
     
-    def fetch_html(self) -> str:
+    async def fetch_html(self) -> str:
         """
-        Fetch HTML content from the target URL.
+        Fetch HTML content from the target URL using the shared aiohttp session.
         
         Returns:
             Raw HTML source code as string
             
         Raises:
             ConnectionError: If the request fails
+            PageTooLargeError: If the page is larger than max_bytes
             ValueError: If the URL is invalid
         """
         try:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
-            response = requests.get(self.url, headers=headers, timeout=self.timeout)
-            response.raise_for_status()
-            
-            self.html_content = response.text
-            self.soup = BeautifulSoup(self.html_content, 'html.parser')
+            async with self.http.get(
+                self.url,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                response.raise_for_status()
+                
+                if response.content_length is not None and response.content_length > self.max_bytes:
+                    raise PageTooLargeError(f"Page exceeds {self.max_bytes} bytes")
+                
+                # Read incrementally so an oversized body is abandoned early
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(65536):
+                    body.extend(chunk)
+                    if len(body) > self.max_bytes:
+                        raise PageTooLargeError(f"Page exceeds {self.max_bytes} bytes")
+                
+                self.html_content = body.decode(_page_encoding(response, body), errors='replace')
             
             return self.html_content
             
-        except requests.exceptions.Timeout:
+        except asyncio.TimeoutError:
             raise ConnectionError(f"Request timeout after {self.timeout} seconds")
-        except requests.exceptions.RequestException as e:
+        except aiohttp.ClientError as e:
             raise ConnectionError(f"Failed to fetch URL: {str(e)}")
     
-    def extract_css_files(self) -> List[str]:
+    def extract_all(self) -> Dict[str, List[str]]:
         """
-        Extract all CSS file URLs from the HTML.
+        Extract all asset URLs and design elements in a single pass over the parsed tree.
         
         Returns:
-            List of absolute CSS file URLs
+            Dictionary with css_files, js_files, images, others, colors and fonts lists
         """
-        if not self.soup:
-            return []
+        if self._extracted is not None:
+            return self._extracted
         
-        css_files = []
+        # Parse lazily so fetching and CPU-bound extraction can run in different processes
+        if self.tree is None and self.html_content:
+            self.tree = LexborHTMLParser(self.html_content)
         
-        # Find all <link> tags with rel="stylesheet"
-        for link in self.soup.find_all('link', rel='stylesheet'):
-            href = link.get('href')
-            if href:
-                absolute_url = urljoin(self.url, href)
-                css_files.append(absolute_url)
+        if self.tree is None:
+            return {key: [] for key in _RESULT_KEYS}
         
-        # Find inline <style> imports
-        for style in self.soup.find_all('style'):
-            style_content = style.string or ''
-            imports = re.findall(r'@import\s+["\']([^"\']+)["\']', style_content)
-            for imp in imports:
-                absolute_url = urljoin(self.url, imp)
-                css_files.append(absolute_url)
+        css_files = []
+        js_files = []
+        images = []
+        other_files = []
+        # Dicts double as insertion-ordered sets
+        colors: Dict[str, None] = {}
+        fonts: Dict[str, None] = {}
+        
+        # Per-tag and inline-style counters that bound the per-node work on bloated pages;
+        # nodes past a cap are still returned by the query, just skipped
+        tag_counts: Dict[str, int] = {}
+        styled_elements = 0
+        
+        # URLs resolved for this page only, so repeated references are joined once
+        # without holding on to them (or inline data: URIs) across pages
+        base = self.url
+        joined: Dict[str, str] = {}
+        
+        def join(url: str) -> str:
+            absolute_url = joined.get(url)
+            if absolute_url is None:
+                absolute_url = joined[url] = urljoin(base, url)
+            return absolute_url
+        
+        previous_id = None
+
+        for node in self.tree.css(_ASSET_SELECTOR):
+            # Lexbor yields an element once per selector it matches, back to back
+            if node.mem_id == previous_id:
+                continue
+            previous_id = node.mem_id
+
+            name = node.tag
+            count = tag_counts.get(name, 0) + 1
+            if count > MAX_ELEMENTS_PER_TAG:
+                continue
+            tag_counts[name] = count
+            attrs = node.attributes
+            
+            if name == 'link':
+                href = attrs.get('href')
+                if href:
+                    # Stylesheets and font files referenced from <link> tags
+                    absolute_url = join(href)
+                    if 'stylesheet' in (attrs.get('rel') or '').split():
+                        css_files.append(absolute_url)
+                    if _ext(href) in _FONT_EXTS:
+                        other_files.append(absolute_url)
+            
+            elif name == 'script':
+                src = attrs.get('src')
+                if src:
+                    js_files.append(join(src))
+            
+            elif name == 'img':
+                src = attrs.get('src')
+                if src:
+                    images.append(join(src))
+                
+                # Absolute URLs listed in srcset
+                srcset = attrs.get('srcset')
+                if srcset:
+                    images.extend(_SRCSET_URL_RE.findall(srcset))
+            
+            elif name == 'source':
+                # Images in picture > source elements
+                srcset = attrs.get('srcset')
+                if srcset:
+                    for url in _SRCSET_TOKEN_RE.findall(srcset):
+                        absolute_url = join(url)
+                        if _ext(absolute_url) in _IMAGE_EXTS:
+                            images.append(absolute_url)
+                
+                # Video and audio sources
+                src = attrs.get('src')
+                if src:
+                    other_files.append(join(src))
+            
+            elif name in ('video', 'audio'):
+                src = attrs.get('src')
+                if src:
+                    other_files.append(join(src))
+            
+            elif name == 'a':
+                # Links to downloadable files
+                href = attrs.get('href')
+                if href and _ext(href) in _OTHER_EXTS:
+                    other_files.append(join(href))
+            
+            elif name == 'style':
+                style_content = node.text()
+                
+                # Stylesheets pulled in through @import
+                css_files.extend(join(imp) for imp in _IMPORT_RE.findall(style_content))
+                
+                for color in _COLOR_RE.findall(style_content):
+                    colors[color] = None
+                
+                for family in _FONT_RE.findall(style_content):
+                    for font in family.split(','):
+                        cleaned_font = font.strip().strip('"\'')
+                        if cleaned_font:
+                            fonts[cleaned_font] = None
+                
+                # Extract from @font-face declarations
+                for font in _FONTFACE_RE.findall(style_content):
+                    cleaned_font = font.strip()
+                    if cleaned_font:
+                        fonts[cleaned_font] = None
+            
+            # Inline styles can appear on any element
+            style = attrs.get('style')
+            if style is None or styled_elements >= MAX_STYLED_ELEMENTS:
+                continue
+            styled_elements += 1
+            
+            # Background images
+            for bg_img in _BG_URL_RE.findall(style):
+                absolute_url = join(bg_img)
+                if _ext(absolute_url) in _IMAGE_EXTS:
+                    images.append(absolute_url)
+            
+            for color in _COLOR_RE.findall(style):
+                colors[color] = None
+            
+            for family in _FONT_RE.findall(style):
+                for font in family.split(','):
+                    cleaned_font = font.strip().strip('"\'')
+                    if cleaned_font:
+                        fonts[cleaned_font] = None
+        
+        self._extracted = {
+            'css_files': list(dict.fromkeys(css_files)),  # Remove duplicates, keep page order
+            'js_files': list(dict.fromkeys(js_files)),
+            'images': list(dict.fromkeys(images)),
+            'others': list(dict.fromkeys(other_files)),
+            'colors': list(colors),
+            'fonts': list(fonts),
+        }
+        return self._extracted
+    
+    def extract_css_files(self) -> List[str]:
+        """
+        Extract all CSS file URLs from the HTML.
         
-        return list(set(css_files))  # Remove duplicates
+        Returns:
+            List of absolute CSS file URLs
+        """
+        return self.extract_all()['css_files']
     
     def extract_js_files(self) -> List[str]:
         """
@@ -90,19 +333,7 @@ class WebsiteExtractor:
         Returns:
             List of absolute JavaScript file URLs
         """
-        if not self.soup:
-            return []
-        
-        js_files = []
-        
-        # Find all <script> tags with src attribute
-        for script in self.soup.find_all('script', src=True):
-            src = script.get('src')
-            if src:
-                absolute_url = urljoin(self.url, src)
-                js_files.append(absolute_url)
-        
-        return list(set(js_files))  # Remove duplicates
+        return self.extract_all()['js_files']
     
     def extract_images(self) -> List[str]:
         """
@@ -111,45 +342,7 @@ class WebsiteExtractor:
         Returns:
             List of absolute image URLs
         """
-        if not self.soup:
-            return []
-        
-        images = []
-        image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.bmp')
-        
-        # Find all <img> tags
-        for img in self.soup.find_all('img', src=True):
-            src = img.get('src')
-            if src:
-                absolute_url = urljoin(self.url, src)
-                images.append(absolute_url)
-        
-        # Find images in srcset attribute
-        for img in self.soup.find_all('img', srcset=True):
-            srcset = img.get('srcset', '')
-            urls = re.findall(r'(https?://[^\s,]+)', srcset)
-            for url in urls:
-                images.append(url)
-        
-        # Find images in picture > source elements
-        for source in self.soup.find_all('source', srcset=True):
-            srcset = source.get('srcset', '')
-            urls = re.findall(r'([^\s,]+)', srcset)
-            for url in urls:
-                absolute_url = urljoin(self.url, url.split()[0])
-                if any(absolute_url.lower().endswith(ext) for ext in image_extensions):
-                    images.append(absolute_url)
-        
-        # Find background images in inline styles
-        for element in self.soup.find_all(style=True):
-            style = element.get('style', '')
-            bg_images = re.findall(r'url\(["\']?([^"\')]+)["\']?\)', style)
-            for bg_img in bg_images:
-                absolute_url = urljoin(self.url, bg_img)
-                if any(absolute_url.lower().endswith(ext) for ext in image_extensions):
-                    images.append(absolute_url)
-        
-        return list(set(images))  # Remove duplicates
+        return self.extract_all()['images']
     
     def extract_other_files(self) -> List[str]:
         """
@@ -158,43 +351,7 @@ class WebsiteExtractor:
         Returns:
             List of absolute URLs for other file types
         """
-        if not self.soup:
-            return []
-        
-        other_files = []
-        other_extensions = ('.pdf', '.doc', '.docx', '.xls', '.xlsx', '.zip', 
-                           '.woff', '.woff2', '.ttf', '.eot', '.otf',
-                           '.mp4', '.webm', '.mp3', '.wav', '.ogg')
-        
-        # Find all <a> tags with downloadable files
-        for link in self.soup.find_all('a', href=True):
-            href = link.get('href')
-            if href and any(href.lower().endswith(ext) for ext in other_extensions):
-                absolute_url = urljoin(self.url, href)
-                other_files.append(absolute_url)
-        
-        # Find font files in <link> tags
-        for link in self.soup.find_all('link', href=True):
-            href = link.get('href')
-            if href and any(href.lower().endswith(ext) for ext in ('.woff', '.woff2', '.ttf', '.eot', '.otf')):
-                absolute_url = urljoin(self.url, href)
-                other_files.append(absolute_url)
-        
-        # Find video sources
-        for video in self.soup.find_all(['video', 'source'], src=True):
-            src = video.get('src')
-            if src:
-                absolute_url = urljoin(self.url, src)
-                other_files.append(absolute_url)
-        
-        # Find audio sources
-        for audio in self.soup.find_all(['audio', 'source'], src=True):
-            src = audio.get('src')
-            if src:
-                absolute_url = urljoin(self.url, src)
-                other_files.append(absolute_url)
-        
-        return list(set(other_files))  # Remove duplicates
+        return self.extract_all()['others']
     
     def extract_colors(self) -> List[str]:
         """
@@ -203,49 +360,7 @@ class WebsiteExtractor:
         Returns:
             List of color values (HEX, RGB, RGBA, color names)
         """
-        if not self.soup:
-            return []
-        
-        colors: Set[str] = set()
-        
-        # Regex patterns for different color formats
-        hex_pattern = r'#([A-Fa-f0-9]{6}|[A-Fa-f0-9]{3})\b'
-        rgb_pattern = r'rgb\s*\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*\)'
-        rgba_pattern = r'rgba\s*\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*,\s*[\d.]+\s*\)'
-        hsl_pattern = r'hsl\s*\(\s*\d+\s*,\s*\d+%\s*,\s*\d+%\s*\)'
-        
-        # Extract from inline styles
-        for element in self.soup.find_all(style=True):
-            style = element.get('style', '')
-            
-            # Find all color patterns
-            colors.update(re.findall(hex_pattern, style))
-            colors.update(re.findall(rgb_pattern, style, re.IGNORECASE))
-            colors.update(re.findall(rgba_pattern, style, re.IGNORECASE))
-            colors.update(re.findall(hsl_pattern, style, re.IGNORECASE))
-        
-        # Extract from <style> tags
-        for style in self.soup.find_all('style'):
-            style_content = style.string or ''
-            
-            # Find all color patterns
-            hex_colors = re.findall(hex_pattern, style_content)
-            colors.update(['#' + c for c in hex_colors])
-            colors.update(re.findall(rgb_pattern, style_content, re.IGNORECASE))
-            colors.update(re.findall(rgba_pattern, style_content, re.IGNORECASE))
-            colors.update(re.findall(hsl_pattern, style_content, re.IGNORECASE))
-        
-        # Clean up hex colors (remove duplicate # if present)
-        cleaned_colors = []
-        for color in colors:
-            if color.startswith('#'):
-                cleaned_colors.append(color)
-            elif re.match(r'^[A-Fa-f0-9]{3,6}$', color):
-                cleaned_colors.append('#' + color)
-            else:
-                cleaned_colors.append(color)
-        
-        return sorted(list(set(cleaned_colors)))
+        return self.extract_all()['colors']
     
     def extract_fonts(self) -> List[str]:
         """
@@ -254,44 +369,7 @@ class WebsiteExtractor:
         Returns:
             List of font family names
         """
-        if not self.soup:
-            return []
-        
-        fonts: Set[str] = set()
-        
-        # Extract from inline styles
-        for element in self.soup.find_all(style=True):
-            style = element.get('style', '')
-            font_families = re.findall(r'font-family\s*:\s*([^;]+)', style, re.IGNORECASE)
-            for family in font_families:
-                # Split by comma and clean up
-                for font in family.split(','):
-                    cleaned_font = font.strip().strip('"\'')
-                    if cleaned_font:
-                        fonts.add(cleaned_font)
-        
-        # Extract from <style> tags
-        for style in self.soup.find_all('style'):
-            style_content = style.string or ''
-            font_families = re.findall(r'font-family\s*:\s*([^;}]+)', style_content, re.IGNORECASE)
-            for family in font_families:
-                # Split by comma and clean up
-                for font in family.split(','):
-                    cleaned_font = font.strip().strip('"\'')
-                    if cleaned_font:
-                        fonts.add(cleaned_font)
-        
-        # Extract from @font-face declarations
-        for style in self.soup.find_all('style'):
-            style_content = style.string or ''
-            font_face_names = re.findall(r'@font-face\s*\{[^}]*font-family\s*:\s*["\']?([^"\';}]+)', 
-                                         style_content, re.IGNORECASE | re.DOTALL)
-            for font in font_face_names:
-                cleaned_font = font.strip()
-                if cleaned_font:
-                    fonts.add(cleaned_font)
-        
-        return sorted(list(fonts))
+        return self.extract_all()['fonts']
     
     def build_file_structure(self, file_urls: List[str]) -> Dict[str, Any]:
         """
@@ -307,27 +385,45 @@ class WebsiteExtractor:
         
         for url in file_urls:
             try:
-                parsed = urlparse(url)
-                path = parsed.path.strip('/')
-                
-                if not path:
-                    continue
-                
-                parts = path.split('/')
-                current = structure
-                
-                # Build nested dictionary structure
-                for i, part in enumerate(parts):
-                    if i == len(parts) - 1:
-                        # It's a file
-                        current[part] = url
-                    else:
-                        # It's a directory
-                        if part not in current:
-                            current[part] = {}
-                        if isinstance(current[part], dict):
-                            current = current[part]
-            except Exception:
+                parts = urlparse(url).path.strip('/').split('/')
+            except ValueError:
+                continue
+            
+            if not parts[0]:
                 continue
+            
+            # Walk/create directories. A file whose name is also a directory is kept
+            # inside that directory under DIR_SELF_KEY, whichever URL comes first.
+            node = structure
+            for part in parts[:-1]:
+                child = node.get(part)
+                if not isinstance(child, dict):
+                    child = {} if child is None else {DIR_SELF_KEY: child}
+                    node[part] = child
+                node = child
+            
+            leaf = parts[-1]
+            if isinstance(node.get(leaf), dict):
+                node[leaf][DIR_SELF_KEY] = url
+            else:
+                node[leaf] = url
         
-        return structure
\ No newline at end of file
+        return structure
+
+
+def extract_from_html(url: str, html_content: str) -> Dict[str, List[str]]:
+    """
+    Parse already-fetched HTML and extract its assets and design elements.
+    
+    Defined at module level so it can be pickled and run in a worker process.
+    
+    Args:
+        url: The URL the HTML was fetched from, used to resolve relative links
+        html_content: Raw HTML source code
+        
+    Returns:
+        Dictionary in the format returned by WebsiteExtractor.extract_all
+    """
+    extractor = WebsiteExtractor(url)
+    extractor.html_content = html_content
+    return extractor.extract_all()
\ No newline at end of file